@@ -111,7 +111,7 @@ def get_ssml(text, voice_name, rate, pitch, style):
 <voice name="{voice_name}">
     <mstts:express-as style="{style}" styledegree="1.0" role="default">
         <prosody rate="{rate}%" pitch="{pitch}%">
-            {text}
+            {html.escape(text, quote=False)}
         </prosody>
     </mstts:express-as>
 </voice>
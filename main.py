@@ -1,6 +1,7 @@
 # main.py
 # 导入我们刚才保存的那个 azure_tts 文件里的功能
 from azure_tts import get_voice
+from tts_service import normalize_text
 
 
 def run():
@@ -124,6 +125,9 @@ def run():
     # ═════════════════════════════════════════════════════════════
     print("正在合成语音，请稍等...")
 
+    # 去掉缩进、硬换行和多余空白，少发字符、合成更快
+    text = normalize_text(text)
+
     try:
         audio_data = get_voice(
             text=text,
@@ -36,6 +36,95 @@
   apply(getPref());
 })();
 
+/* ── Local Cache (IndexedDB) ── */
+
+const CACHE_DB_NAME = "tts-cache";
+const CACHE_DB_VERSION = 1;
+const AUDIO_STORE = "audio";
+const META_STORE = "meta";
+const MAX_CACHED_AUDIO = 30;
+const PREVIEW_SUFFIX = "-first";
+
+let cacheDbPromise = null;
+
+function openCacheDb() {
+  if (!window.indexedDB) return Promise.resolve(null);
+  if (!cacheDbPromise) {
+    cacheDbPromise = new Promise(function (resolve) {
+      const req = indexedDB.open(CACHE_DB_NAME, CACHE_DB_VERSION);
+      req.onupgradeneeded = function () {
+        const db = req.result;
+        if (!db.objectStoreNames.contains(AUDIO_STORE)) {
+          db.createObjectStore(AUDIO_STORE, { keyPath: "key" }).createIndex("storedAt", "storedAt");
+        }
+        if (!db.objectStoreNames.contains(META_STORE)) {
+          db.createObjectStore(META_STORE, { keyPath: "key" });
+        }
+      };
+      req.onsuccess = function () { resolve(req.result); };
+      req.onerror = function () { resolve(null); };
+    });
+  }
+  return cacheDbPromise;
+}
+
+// Cache failures (private mode, quota) degrade to a miss instead of an error.
+async function cacheRequest(storeName, mode, action) {
+  const db = await openCacheDb();
+  if (!db) return null;
+  return new Promise(function (resolve) {
+    let req;
+    try {
+      req = action(db.transaction(storeName, mode).objectStore(storeName));
+    } catch (_) {
+      resolve(null);
+      return;
+    }
+    req.onsuccess = function () { resolve(req.result === undefined ? null : req.result); };
+    req.onerror = function () { resolve(null); };
+  });
+}
+
+function cacheGet(storeName, key) {
+  return cacheRequest(storeName, "readonly", (store) => store.get(key));
+}
+
+function cachePut(storeName, record) {
+  return cacheRequest(storeName, "readwrite", (store) => store.put(record));
+}
+
+async function pruneAudioCache() {
+  const keys = await cacheRequest(AUDIO_STORE, "readonly", (store) => store.index("storedAt").getAllKeys());
+  if (!keys || keys.length <= MAX_CACHED_AUDIO) return;
+  for (const key of keys.slice(0, keys.length - MAX_CACHED_AUDIO)) {
+    await cacheRequest(AUDIO_STORE, "readwrite", (store) => store.delete(key));
+  }
+}
+
+async function storeAudio(key, blob, filename) {
+  await cachePut(AUDIO_STORE, { key: key, blob: blob, filename: filename, storedAt: Date.now() });
+  if (!key.endsWith(PREVIEW_SUFFIX)) {
+    // The full file supersedes its speculative first chunk.
+    await cacheRequest(AUDIO_STORE, "readwrite", (store) => store.delete(`${key}${PREVIEW_SUFFIX}`));
+  }
+  await pruneAudioCache();
+}
+
+// Same field order and hash as tts_service.synthesis_cache_key, so keys match the server ETag.
+// Without SubtleCrypto (plain-HTTP LAN access) there is no matching key, so caching is skipped.
+async function synthesisCacheKey(payload) {
+  const serialized = JSON.stringify([
+    payload.text,
+    payload.voice_name,
+    payload.style,
+    payload.rate,
+    payload.pitch,
+  ]);
+  if (!window.crypto || !window.crypto.subtle) return null;
+  const digest = await window.crypto.subtle.digest("SHA-256", new TextEncoder().encode(serialized));
+  return [...new Uint8Array(digest)].map((b) => b.toString(16).padStart(2, "0")).join("");
+}
+
 /* ── TTS Controls ── */
 
 const textInput = document.getElementById("textInput");
@@ -50,9 +139,15 @@ const errorBox = document.getElementById("errorBox");
 const resultBox = document.getElementById("resultBox");
 const audioPlayer = document.getElementById("audioPlayer");
 const downloadLink = document.getElementById("downloadLink");
+const speculativeToggle = document.getElementById("speculativeToggle");
+
+const VOICES_CACHE_KEY = "voices";
+const SPECULATIVE_DELAY_MS = 800;
 
 let currentAudioUrl = null;
 let isLoading = false;
+let speculativeTimer = null;
+let speculativeController = null;
 
 function updateButtonState() {
   const hasText = textInput.value.trim().length > 0;
@@ -81,6 +176,41 @@ function resetAudioUrl() {
   }
 }
 
+function showAudio(blob, filename, isPreview) {
+  resetAudioUrl();
+  currentAudioUrl = URL.createObjectURL(blob);
+
+  audioPlayer.src = currentAudioUrl;
+  downloadLink.href = currentAudioUrl;
+  downloadLink.download = filename;
+  downloadLink.classList.toggle("hidden", Boolean(isPreview));
+  resultBox.classList.remove("hidden");
+}
+
+function describeSavings(headers) {
+  const charsSaved = Number(headers.get("X-TTS-Chars-Saved")) || 0;
+  const chunksAvoided = Number(headers.get("X-TTS-Chunks-Avoided")) || 0;
+  if (charsSaved <= 0 && chunksAvoided <= 0) return "";
+  return `（文本精简 ${Math.max(charsSaved, 0)} 字，少合成 ${Math.max(chunksAvoided, 0)} 段）`;
+}
+
+function canonicalNumber(value) {
+  const trimmed = String(value).trim();
+  if (!trimmed) return "0";
+  return /^[+-]?\d+$/.test(trimmed) ? String(parseInt(trimmed, 10)) : trimmed;
+}
+
+// Mirrors validate_synthesis_payload so the cache key is computed over the same values as the server ETag.
+function buildPayload() {
+  return {
+    text: textInput.value.replace(/\r\n/g, "\n"),
+    voice_name: voiceSelect.value.trim() || "zh-CN-XiaoxiaoNeural",
+    style: styleSelect.value.trim() || "narration-relaxed",
+    rate: canonicalNumber(rateInput.value),
+    pitch: canonicalNumber(pitchInput.value),
+  };
+}
+
 function setLoading(loading, message) {
   isLoading = loading;
   generateBtn.textContent = loading ? "生成中..." : "生成语音";
@@ -105,32 +235,49 @@ function parseFilenameFromDisposition(headerValue) {
   return "tts_output.mp3";
 }
 
+function renderVoices(voices) {
+  const previous = voiceSelect.value;
+  voiceSelect.innerHTML = "";
+  for (const voice of voices) {
+    const option = document.createElement("option");
+    option.value = voice.short_name;
+    const localeText = voice.locale ? ` / ${voice.locale}` : "";
+    const genderText = voice.gender ? ` / ${voice.gender}` : "";
+    option.textContent = `${voice.short_name}${localeText}${genderText}`;
+    voiceSelect.appendChild(option);
+  }
+
+  const values = [...voiceSelect.options].map((item) => item.value);
+  if (previous && values.includes(previous)) {
+    voiceSelect.value = previous;
+  } else if (values.includes("zh-CN-XiaoxiaoNeural")) {
+    voiceSelect.value = "zh-CN-XiaoxiaoNeural";
+  }
+}
+
 async function loadVoices() {
+  const cached = await cacheGet(META_STORE, VOICES_CACHE_KEY);
+  if (cached && Array.isArray(cached.voices) && cached.voices.length > 0) {
+    renderVoices(cached.voices);
+  }
+
   try {
-    const res = await fetch("/api/voices");
+    const headers = cached && cached.etag ? { "If-None-Match": cached.etag } : {};
+    const res = await fetch("/api/voices", { headers: headers, cache: "no-store" });
+    if (res.status === 304) return;
     if (!res.ok) throw new Error("加载音色失败");
     const data = await res.json();
     const voices = Array.isArray(data.voices) ? data.voices : [];
     if (voices.length === 0) return;
 
-    voiceSelect.innerHTML = "";
-    for (const voice of voices) {
-      const option = document.createElement("option");
-      option.value = voice.short_name;
-      const localeText = voice.locale ? ` / ${voice.locale}` : "";
-      const genderText = voice.gender ? ` / ${voice.gender}` : "";
-      option.textContent = `${voice.short_name}${localeText}${genderText}`;
-      voiceSelect.appendChild(option);
-    }
-
-    const defaultOption = [...voiceSelect.options].find(
-      (item) => item.value === "zh-CN-XiaoxiaoNeural"
-    );
-    if (defaultOption) {
-      voiceSelect.value = "zh-CN-XiaoxiaoNeural";
-    }
+    renderVoices(voices);
+    await cachePut(META_STORE, {
+      key: VOICES_CACHE_KEY,
+      etag: res.headers.get("ETag"),
+      voices: voices,
+    });
   } catch (err) {
-    showError("音色列表加载失败，已使用内置音色列表。");
+    if (!cached) showError("音色列表加载失败，已使用内置音色列表。");
   }
 }
 
@@ -138,20 +285,31 @@ async function synthesize() {
   hideError();
   resultBox.classList.add("hidden");
   setLoading(true, "正在合成语音，请稍等...");
+  cancelSpeculative();
 
-  const payload = {
-    text: textInput.value,
-    voice_name: voiceSelect.value,
-    style: styleSelect.value,
-    rate: rateInput.value,
-    pitch: pitchInput.value,
-  };
+  const payload = buildPayload();
 
   try {
+    const key = await synthesisCacheKey(payload);
+    const cached = key ? await cacheGet(AUDIO_STORE, key) : null;
+    if (cached) {
+      showAudio(cached.blob, cached.filename, false);
+      statusText.textContent = "已从本地缓存载入，可以试听或下载。";
+      return;
+    }
+
+    const preview = key ? await cacheGet(AUDIO_STORE, `${key}${PREVIEW_SUFFIX}`) : null;
+    if (preview) {
+      showAudio(preview.blob, preview.filename, true);
+      audioPlayer.play().catch(function () {});
+      statusText.textContent = "首段已开始播放，正在合成剩余内容...";
+    }
+
+    // With a preview in hand only the remaining chunks are synthesized; chunk 1 is not paid for twice.
     const res = await fetch("/api/synthesize", {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify(payload),
+      body: JSON.stringify(preview ? { ...payload, start_chunk: 1 } : payload),
     });
 
     if (!res.ok) {
@@ -165,18 +323,24 @@ async function synthesize() {
       throw new Error(message);
     }
 
-    const blob = await res.blob();
-    resetAudioUrl();
-    currentAudioUrl = URL.createObjectURL(blob);
-
-    audioPlayer.src = currentAudioUrl;
-    downloadLink.href = currentAudioUrl;
-    downloadLink.download = parseFilenameFromDisposition(
-      res.headers.get("Content-Disposition")
-    );
+    const received = await res.blob();
+    const blob = preview ? new Blob([preview.blob, received], { type: "audio/mpeg" }) : received;
+    const filename = parseFilenameFromDisposition(res.headers.get("Content-Disposition"));
+    if (key) await storeAudio(key, blob, filename);
+
+    // The full MP3 starts with the previewed chunk, so keep the playback position.
+    const resumeTime = preview ? audioPlayer.currentTime : 0;
+    // A preview that already played to its end should carry straight on into the rest.
+    const resumePlaying = preview ? !audioPlayer.paused || audioPlayer.ended : false;
+    showAudio(blob, filename, false);
+    if (preview) {
+      audioPlayer.addEventListener("loadedmetadata", function () {
+        audioPlayer.currentTime = resumeTime;
+        if (resumePlaying) audioPlayer.play().catch(function () {});
+      }, { once: true });
+    }
 
-    resultBox.classList.remove("hidden");
-    statusText.textContent = "合成完成，可以试听或下载。";
+    statusText.textContent = "合成完成，可以试听或下载。" + describeSavings(res.headers);
   } catch (err) {
     showError(err.message || "合成失败，请检查网络后重试。");
     statusText.textContent = "合成失败。";
@@ -185,6 +349,64 @@ async function synthesize() {
   }
 }
 
+/* ── Speculative first-chunk synthesis ── */
+
+function cancelSpeculative() {
+  clearTimeout(speculativeTimer);
+  if (speculativeController) {
+    speculativeController.abort();
+    speculativeController = null;
+  }
+}
+
+function scheduleSpeculative() {
+  cancelSpeculative();
+  if (!speculativeToggle || !speculativeToggle.checked) return;
+  if (!textInput.value.trim()) return;
+  speculativeTimer = setTimeout(preSynthesizeFirstChunk, SPECULATIVE_DELAY_MS);
+}
+
+async function preSynthesizeFirstChunk() {
+  if (isLoading) return;
+  const payload = buildPayload();
+  const controller = new AbortController();
+  speculativeController = controller;
+
+  try {
+    const key = await synthesisCacheKey(payload);
+    if (!key) return;
+    if (await cacheGet(AUDIO_STORE, key)) return;
+    if (await cacheGet(AUDIO_STORE, `${key}${PREVIEW_SUFFIX}`)) return;
+
+    const res = await fetch("/api/synthesize/preview", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+      signal: controller.signal,
+    });
+    if (!res.ok) return;
+
+    const blob = await res.blob();
+    if (!controller.signal.aborted) await storeAudio(`${key}${PREVIEW_SUFFIX}`, blob, "tts_preview.mp3");
+  } catch (_) {
+    // Speculative work is best-effort; the click path synthesizes normally.
+  } finally {
+    if (speculativeController === controller) speculativeController = null;
+  }
+}
+
+if (speculativeToggle) {
+  speculativeToggle.checked = localStorage.getItem("speculative") === "on";
+  speculativeToggle.addEventListener("change", function () {
+    localStorage.setItem("speculative", speculativeToggle.checked ? "on" : "off");
+    scheduleSpeculative();
+  });
+  textInput.addEventListener("input", scheduleSpeculative);
+  for (const control of [voiceSelect, styleSelect, rateInput, pitchInput]) {
+    control.addEventListener("change", scheduleSpeculative);
+  }
+}
+
 textInput.addEventListener("input", updateCharCount);
 generateBtn.addEventListener("click", synthesize);
 window.addEventListener("beforeunload", resetAudioUrl);
@@ -325,6 +547,31 @@ removeFileBtn.addEventListener("click", clearFile);
 
 /* ── Transcribe ── */
 
+async function readNdjson(res, onEvent) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  try {
+    while (true) {
+      const { value, done } = await reader.read();
+      buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+      let newline;
+      while ((newline = buffer.indexOf("\n")) >= 0) {
+        const line = buffer.slice(0, newline).trim();
+        buffer = buffer.slice(newline + 1);
+        if (line) onEvent(JSON.parse(line));
+      }
+      if (done) break;
+    }
+    if (buffer.trim()) onEvent(JSON.parse(buffer));
+  } catch (err) {
+    reader.cancel().catch(function () {});
+    throw err;
+  }
+}
+
+// Uploads the audio once; /api/pipeline returns the whole transcript, then streams its analysis.
 async function doTranscribe() {
   if (!selectedFile || isTranscribing) return;
   hideTranscribeError();
@@ -332,12 +579,14 @@ async function doTranscribe() {
   transcribeResultPanel.classList.add("hidden");
   analysisResultPanel.classList.add("hidden");
   exportPanel.classList.add("hidden");
+  transcribeOutput.value = "";
+  analysisRawText = "";
 
   const formData = new FormData();
   formData.append("file", selectedFile);
 
   try {
-    const res = await fetch("/api/transcribe", {
+    const res = await fetch("/api/pipeline", {
       method: "POST",
       body: formData,
     });
@@ -352,19 +601,37 @@ async function doTranscribe() {
       throw new Error(msg);
     }
 
-    const data = await res.json();
-    const text = (data.text || "").trim();
-    if (!text) throw new Error("转录结果为空，请检查音频是否包含语音。");
+    let finished = false;
+    await readNdjson(res, function (event) {
+      if (event.type === "transcript") {
+        const prefix = transcribeOutput.value ? "\n" : "";
+        transcribeOutput.value += prefix + event.text;
+        updateTranscribeCharCount();
+        transcribeResultPanel.classList.remove("hidden");
+        updateExportVisibility();
+        setTranscribeLoading(true, "转录完成，正在分析…");
+        setAnalyzeLoading(true, "正在分析…");
+      } else if (event.type === "analysis") {
+        analysisRawText += event.delta || "";
+        analysisOutput.innerHTML = renderMarkdown(analysisRawText);
+        analysisResultPanel.classList.remove("hidden");
+      } else if (event.type === "error") {
+        throw new Error(event.message || "处理失败，请稍后再试。");
+      } else if (event.type === "done") {
+        finished = true;
+      }
+    });
+    if (!finished) throw new Error("连接中断，结果可能不完整。");
 
-    transcribeOutput.value = text;
-    updateTranscribeCharCount();
-    transcribeResultPanel.classList.remove("hidden");
-    exportPanel.classList.remove("hidden");
     updateExportVisibility();
-    setTranscribeLoading(false, "转录完成！");
+    setAnalyzeLoading(false, "分析完成！");
+    setTranscribeLoading(false, "转录与分析完成！");
   } catch (err) {
     showTranscribeError(err.message || "转录失败，请检查网络后重试。");
-    setTranscribeLoading(false, "转录失败。");
+    const hasTranscript = transcribeOutput.value.trim().length > 0;
+    if (isAnalyzing) setAnalyzeLoading(false, "分析失败。");
+    updateExportVisibility();
+    setTranscribeLoading(false, hasTranscript ? "转录完成，分析未完成。" : "转录失败。");
   }
 }
 
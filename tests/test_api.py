@@ -1,5 +1,7 @@
+import io
+import json
 import unittest
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 from web_app import app
 
@@ -56,6 +58,172 @@ class TestAPI(unittest.TestCase):
         self.assertIn("voices", data)
         self.assertEqual(len(data["voices"]), 1)
 
+    @patch("web_app.get_available_voices")
+    def test_voices_etag_revalidation(self, mock_voices):
+        mock_voices.return_value = [{"short_name": "zh-CN-XiaoxiaoNeural", "locale": "zh-CN"}]
+        first = self.client.get("/api/voices")
+        etag = first.headers.get("ETag")
+        self.assertTrue(etag)
+        self.assertEqual(first.headers.get("Cache-Control"), "no-cache")
+
+        second = self.client.get("/api/voices", headers={"If-None-Match": etag})
+        self.assertEqual(second.status_code, 304)
+
+    @patch("web_app.synthesize_text")
+    def test_synthesize_etag_is_request_key(self, mock_synthesize):
+        mock_synthesize.return_value = b"FAKE_MP3_DATA"
+        payload = {"text": "你好，世界。", "voice_name": "zh-CN-XiaoxiaoNeural"}
+        first = self.client.post("/api/synthesize", json=payload)
+        etag = first.headers.get("ETag")
+        self.assertTrue(etag)
+
+        repeat = self.client.post("/api/synthesize", json=payload, headers={"If-None-Match": etag})
+        self.assertEqual(repeat.status_code, 200)
+        self.assertEqual(repeat.headers.get("ETag"), etag)
+
+        changed = self.client.post("/api/synthesize", json={**payload, "rate": "10"})
+        self.assertNotEqual(changed.headers.get("ETag"), etag)
+
+    @patch("web_app.synthesize_text")
+    def test_synthesize_reports_normalization_savings(self, mock_synthesize):
+        mock_synthesize.return_value = b"FAKE_MP3_DATA"
+        response = self.client.post("/api/synthesize", json={"text": "    **你好**，\n\n\n    世界。   "})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response.headers["X-TTS-Chars-Saved"]), 0)
+        self.assertIn("X-TTS-Chunks-Avoided", response.headers)
+        self.assertEqual(mock_synthesize.call_args.kwargs["plan"]["chunks"], ["你好，\n世界。"])
+
+    @patch("web_app.synthesize_text")
+    def test_synthesize_normalize_options(self, mock_synthesize):
+        mock_synthesize.return_value = b"FAKE_MP3_DATA"
+        text = "**你好**，世界。"
+        default = self.client.post("/api/synthesize", json={"text": text})
+        self.assertEqual(mock_synthesize.call_args.kwargs["plan"]["chunks"], ["你好，世界。"])
+
+        raw = self.client.post("/api/synthesize", json={"text": text, "normalize": {"strip_markup": False}})
+        self.assertEqual(raw.status_code, 200)
+        self.assertEqual(mock_synthesize.call_args.kwargs["plan"]["chunks"], [text])
+        self.assertNotEqual(raw.headers.get("ETag"), default.headers.get("ETag"))
+
+        explicit = self.client.post("/api/synthesize", json={"text": text, "normalize": {"strip_markup": True}})
+        self.assertEqual(explicit.headers.get("ETag"), default.headers.get("ETag"))
+
+    def test_synthesize_rejects_bad_normalize_options(self):
+        for normalize in ({"unknown": True}, {"strip_markup": "no"}, ["strip_markup"]):
+            response = self.client.post("/api/synthesize", json={"text": "你好", "normalize": normalize})
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.get_json()["error_code"], "invalid_request")
+
+    @patch("web_app.synthesize_text")
+    def test_synthesize_remainder_after_preview(self, mock_synthesize):
+        mock_synthesize.return_value = b"REST"
+        payload = {"text": "第一句。第二句。"}
+        full = self.client.post("/api/synthesize", json=payload)
+        rest = self.client.post("/api/synthesize", json={**payload, "start_chunk": 1})
+        self.assertEqual(rest.status_code, 200)
+        self.assertEqual(mock_synthesize.call_args.kwargs["start_chunk"], 1)
+        self.assertNotEqual(rest.headers.get("ETag"), full.headers.get("ETag"))
+
+        bad = self.client.post("/api/synthesize", json={**payload, "start_chunk": -1})
+        self.assertEqual(bad.status_code, 400)
+
+    @patch("web_app.synthesize_text")
+    def test_synthesize_preview_first_chunk_only(self, mock_synthesize):
+        mock_synthesize.return_value = b"FIRST_CHUNK"
+        response = self.client.post("/api/synthesize/preview", json={"text": "第一句。第二句。"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"FIRST_CHUNK")
+        self.assertEqual(mock_synthesize.call_args.kwargs["max_chunks"], 1)
+        self.assertTrue(response.headers.get("ETag", "").endswith('-first"'))
+        self.assertNotIn("X-TTS-Chars-Saved", response.headers)
+
+    def test_pipeline_missing_file(self):
+        response = self.client.post("/api/pipeline", data={})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error_code"], "no_file")
+
+    @patch("web_app.http_session.post")
+    def test_pipeline_streams_transcript_and_analysis(self, mock_post):
+        transcribe_resp = MagicMock(status_code=200)
+        transcribe_resp.json.return_value = {
+            "text": "第一段。第二段。",
+            "segments": [{"text": "第一段。"}, {"text": "第二段。"}],
+        }
+        analyze_resp = MagicMock()
+        analyze_resp.__enter__.return_value = analyze_resp
+        analyze_resp.iter_lines.return_value = [
+            'data: {"choices": [{"delta": {"content": "总结"}}]}',
+            "",
+            'data: {"choices": [{"delta": {"content": "完成"}}]}',
+            "data: [DONE]",
+        ]
+        mock_post.side_effect = [transcribe_resp, analyze_resp]
+
+        response = self.client.post(
+            "/api/pipeline",
+            data={"file": (io.BytesIO(b"FAKE_AUDIO"), "a.mp3")},
+            content_type="multipart/form-data",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(
+            events,
+            [
+                {"type": "transcript", "index": 0, "text": "第一段。"},
+                {"type": "transcript", "index": 1, "text": "第二段。"},
+                {"type": "analysis", "delta": "总结"},
+                {"type": "analysis", "delta": "完成"},
+                {"type": "done"},
+            ],
+        )
+        self.assertEqual(mock_post.call_args_list[1].kwargs["json"]["messages"][1]["content"], "第一段。\n第二段。")
+        self.assertTrue(mock_post.call_args_list[1].kwargs["json"]["stream"])
+
+    def _post_pipeline(self):
+        response = self.client.post(
+            "/api/pipeline",
+            data={"file": (io.BytesIO(b"FAKE_AUDIO"), "a.mp3")},
+            content_type="multipart/form-data",
+        )
+        self.assertEqual(response.status_code, 200)
+        return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    @patch("web_app.http_session.post")
+    def test_pipeline_transcription_http_error(self, mock_post):
+        mock_post.return_value = MagicMock(status_code=502, text="bad gateway")
+        events = self._post_pipeline()
+        self.assertEqual(events, [{"type": "error", "error_code": "transcribe_failed", "message": "bad gateway"}])
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch("web_app.http_session.post")
+    def test_pipeline_empty_transcript(self, mock_post):
+        transcribe_resp = MagicMock(status_code=200)
+        transcribe_resp.json.return_value = {"text": "  ", "segments": []}
+        mock_post.return_value = transcribe_resp
+        events = self._post_pipeline()
+        self.assertEqual(len(events), 1)
+        self.assertEqual(events[0]["error_code"], "empty_transcript")
+        self.assertEqual(mock_post.call_count, 1)
+
+    @patch("web_app.http_session.post")
+    def test_pipeline_analysis_failure_after_transcript(self, mock_post):
+        transcribe_resp = MagicMock(status_code=200)
+        transcribe_resp.json.return_value = {"text": "你好。", "segments": [{"text": "你好。"}]}
+        analyze_resp = MagicMock()
+        analyze_resp.__enter__.return_value = analyze_resp
+        analyze_resp.iter_lines.return_value = iter(
+            ['data: {"choices": [{"delta": {"content": "部分"}}]}', "data: {broken"]
+        )
+        mock_post.side_effect = [transcribe_resp, analyze_resp]
+
+        events = self._post_pipeline()
+        self.assertEqual(events[0], {"type": "transcript", "index": 0, "text": "你好。"})
+        self.assertEqual(events[1], {"type": "analysis", "delta": "部分"})
+        self.assertEqual(events[2]["type"], "error")
+        self.assertEqual(events[2]["error_code"], "analyze_failed")
+        self.assertNotIn({"type": "done"}, events)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,7 @@
 import unittest
+from unittest.mock import patch
 
-from tts_service import split_text_into_chunks
+from tts_service import normalize_text, plan_synthesis, split_text_into_chunks, synthesize_text
 
 
 class TestChunking(unittest.TestCase):
@@ -25,5 +26,92 @@ class TestChunking(unittest.TestCase):
         self.assertEqual("".join(chunks), text.replace("\r\n", "\n"))
 
 
+class TestNormalization(unittest.TestCase):
+    def test_soft_wraps_and_indentation_collapsed(self):
+        text = "    第一段第一行被编辑器按固定宽度折行，所以这里断开了，\n    第一段第二行。\n\n    第二段。"
+        self.assertEqual(normalize_text(text), "第一段第一行被编辑器按固定宽度折行，所以这里断开了，第一段第二行。\n第二段。")
+
+    def test_list_items_kept_on_own_lines(self):
+        self.assertEqual(normalize_text("- 苹果\n- 香蕉\n- 橙子"), "苹果\n香蕉\n橙子")
+        self.assertEqual(normalize_text("apples\nbananas\noranges"), "apples\nbananas\noranges")
+        self.assertEqual(normalize_text("1. 打开电源\n2. 按下按钮\n3. 等待十秒"), "1、打开电源\n2、按下按钮\n3、等待十秒")
+
+    def test_verse_lines_kept(self):
+        text = "床前明月光\n疑是地上霜\n举头望明月\n低头思故乡"
+        self.assertEqual(normalize_text(text), text)
+
+    def test_short_lines_kept_as_hard_breaks(self):
+        text = "标题\n这是一行比标题长得多的正文内容。"
+        self.assertEqual(normalize_text(text), "标题\n这是一行比标题长得多的正文内容。")
+
+    def test_markup_stripped(self):
+        text = "# 标题\n\n- **重点**见[链接](http://example.com)\n\n<p>Hello&nbsp;world</p>"
+        self.assertEqual(normalize_text(text), "标题\n重点见链接\nHello world")
+
+    def test_markup_stripping_keeps_plain_text(self):
+        self.assertEqual(normalize_text("计算 3*4*5 的值"), "计算3*4*5的值")
+        self.assertEqual(normalize_text("价格 a<b 而 c>d 成立"), "价格a<b而c>d成立")
+        self.assertEqual(normalize_text("snake_case_name和__init__"), "snake_case_name和__init__")
+        self.assertEqual(normalize_text("A &amp; B &lt;C&gt;"), "A & B <C>")
+        self.assertEqual(normalize_text('<span class="x">你好</span>世界'), "你好世界")
+
+    def test_single_newline_paragraphs_kept(self):
+        text = "今天天气很好，阳光明媚，公园里开了很多花。\n明天可能会下雨，出门记得带伞，注意安全哦。\n短。"
+        self.assertEqual(normalize_text(text), text)
+
+    def test_punctuation_normalized(self):
+        self.assertEqual(normalize_text("版本ＡＢＣ１２３很好,对吗?"), "版本ABC123很好，对吗？")
+
+    def test_emphatic_punctuation_and_ellipsis_kept(self):
+        self.assertEqual(normalize_text("他说：“好。。。”"), "他说：“好……”")
+        self.assertEqual(normalize_text("好...真的吗？？太棒了！！！"), "好……真的吗？？太棒了！！！")
+        self.assertEqual(normalize_text("逗号，，顿号、、"), "逗号，顿号、")
+
+    def test_options_disable_stages(self):
+        text = "  **你好** ,世界  "
+        self.assertEqual(
+            normalize_text(text, strip_markup=False, collapse_whitespace=False, normalize_punctuation=False),
+            text,
+        )
+
+    def test_plan_dedupes_repeated_paragraphs(self):
+        paragraph = "这是一个会重复出现的很长的段落，用来确认相同内容只会被合成一次并复用音频。"
+        text = f"{paragraph}\n中间内容。\n{paragraph}"
+        plan = plan_synthesis(text, max_chars=30)
+        chunks, sequence = plan["chunks"], plan["sequence"]
+        self.assertEqual("".join(chunks[index] for index in sequence).replace("\n", ""), text.replace("\n", ""))
+        self.assertEqual(len(sequence), len(chunks) + 2)
+        self.assertGreater(plan["stats"]["chunks_avoided"], 0)
+        self.assertGreater(plan["stats"]["chars_saved"], 0)
+
+    def test_plan_dedupes_single_newline_paragraphs(self):
+        paragraph = "这是一个会重复出现的很长的段落，用来确认单换行分隔的相同段落也只会被合成一次并复用音频。"
+        plan = plan_synthesis(f"{paragraph}\n{paragraph}\n{paragraph}")
+        self.assertEqual(plan["chunks"], [paragraph])
+        self.assertEqual(plan["sequence"], [0, 0, 0])
+        self.assertEqual(plan["stats"]["chars_sent"], len(paragraph))
+
+    @patch("tts_service.get_voice")
+    def test_synthesize_start_chunk_skips_leading_chunks(self, mock_get_voice):
+        mock_get_voice.side_effect = lambda text, **_: text.encode("utf-8")
+        text = "第一句话。第二句话。第三句话。"
+        first = synthesize_text(text, max_chars=5, max_chunks=1)
+        rest = synthesize_text(text, max_chars=5, start_chunk=1)
+        self.assertEqual(first + rest, synthesize_text(text, max_chars=5))
+        self.assertEqual(synthesize_text(text, max_chars=5, start_chunk=10), b"")
+
+    def test_synthesize_rejects_plan_for_other_text(self):
+        with self.assertRaises(ValueError):
+            synthesize_text("另一段文字。", plan=plan_synthesis("原文。"))
+
+    @patch("tts_service.get_voice")
+    def test_synthesize_reuses_repeated_chunks(self, mock_get_voice):
+        mock_get_voice.side_effect = lambda text, **_: text.encode("utf-8")
+        paragraph = "这是一个会重复出现的很长的段落，用来确认相同内容只会被合成一次并复用音频。"
+        audio = synthesize_text(f"{paragraph}\n\n中间内容。\n\n{paragraph}", max_chars=30)
+        self.assertEqual(mock_get_voice.call_count, 3)
+        self.assertEqual(audio.decode("utf-8").count(paragraph), 2)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
+import html
+import json
 import re
-from typing import Dict, List
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
 
 from azure_tts import get_voice, get_voice_list
 
@@ -10,6 +14,19 @@ DEFAULT_STYLE = "narration-relaxed"
 DEFAULT_RATE = "0"
 DEFAULT_PITCH = "0"
 MAX_CHARS_PER_CHUNK = 1200
+# Text clean-up applied before chunking; requests can override any flag through a "normalize" object.
+NORMALIZATION_OPTIONS = {
+    "strip_markup": True,
+    "collapse_whitespace": True,
+    "normalize_punctuation": True,
+    "dedupe_paragraphs": True,
+}
+# A line is only treated as hard-wrapped when it reaches this fraction of the document's wrap column,
+# is at least MIN_WRAP_WIDTH characters long and does not end a sentence.
+SOFT_WRAP_RATIO = 0.8
+MIN_WRAP_WIDTH = 20
+# Shorter repeats are not worth forcing a chunk boundary for.
+DEDUPE_MIN_CHARS = 40
 BUILTIN_VOICES = [
     {"short_name": "zh-CN-XiaoxiaoNeural", "locale": "zh-CN", "gender": "Female", "display_name": "Xiaoxiao"},
     {"short_name": "zh-CN-YunxiNeural", "locale": "zh-CN", "gender": "Male", "display_name": "Yunxi"},
@@ -28,6 +45,40 @@ BUILTIN_VOICES = [
 ]
 
 
+_CJK = "\u2e80-\u2fff\u3001-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff01-\uff60\u2014\u2018-\u201d\u2026"
+_HTML_BREAK_RE = re.compile(r"<br\s*/?>|</(?:p|div|li|h[1-6])>", re.IGNORECASE)
+_HTML_TAG_NAMES = (
+    "a|abbr|b|blockquote|br|code|del|div|em|h[1-6]|hr|i|img|ins|li|mark|ol|p|pre|s|small|span|strong|"
+    "sub|sup|table|tbody|td|th|thead|tr|u|ul"
+)
+# Only real element names directly after "<", with well-formed attributes, so "a<b 而 c>d" is left alone.
+_HTML_TAG_RE = re.compile(
+    rf"<!--.*?-->|</(?:{_HTML_TAG_NAMES})\s*>"
+    rf"|<(?:{_HTML_TAG_NAMES})(?:\s+[A-Za-z_:][-A-Za-z0-9_:.]*(?:\s*=\s*(?:\"[^\"]*\"|'[^']*'|[^\s\"'<>=`]+))?)*\s*/?>",
+    re.DOTALL | re.IGNORECASE,
+)
+_MD_FENCE_RE = re.compile(r"^[ \t]*(?:```|~~~).*$", re.MULTILINE)
+_MD_RULE_RE = re.compile(r"^[ \t]*([-*_])(?:[ \t]*\1){2,}[ \t]*$", re.MULTILINE)
+_MD_HEADING_RE = re.compile(r"^[ \t]*#{1,6}[ \t]+", re.MULTILINE)
+_MD_QUOTE_RE = re.compile(r"^[ \t]*>[ \t]?", re.MULTILINE)
+_LIST_ITEM_RE = re.compile(r"^[ \t]*(?:[-*+][ \t]+|\d+[.)][ \t]+|\d+、)")
+_BULLET_RE = re.compile(r"^[ \t]*[-*+][ \t]+")
+_ORDERED_MARKER_RE = re.compile(r"^([ \t]*\d+)[.)][ \t]+")
+_MD_LINK_RE = re.compile(r"!?\[([^\]\n]*)\]\([^)\n]*\)")
+_MD_CODE_RE = re.compile(r"`([^`\n]*)`")
+# Markers must sit on a word boundary: "3*4*5" and "snake_case和__init__" are plain text.
+_MD_STAR_EMPHASIS_RE = re.compile(r"(?<![A-Za-z0-9_*~])(\*{1,3}|~~)(?=\S)(.+?)(?<=\S)\1(?![A-Za-z0-9_*~])")
+_MD_UNDERSCORE_EMPHASIS_RE = re.compile(r"(?<![\w])(_{2,3})(?=\S)(.+?)(?<=\S)\1(?![\w])")
+_SENTENCE_END_RE = re.compile(r"[。！？；….!?;][”’\"'」』）)]*$")
+_FULLWIDTH_ALNUM_RE = re.compile(r"[\uff10-\uff19\uff21-\uff3a\uff41-\uff5a]")
+_INLINE_SPACE_RE = re.compile(r"[ \t\u3000\xa0]+")
+_CJK_SPACE_RE = re.compile(rf" (?=[{_CJK}])|(?<=[{_CJK}]) ")
+_HALFWIDTH_PUNCT_RE = re.compile(rf"(?<=[{_CJK}])([,.!?;:])")
+_HALFWIDTH_TO_FULLWIDTH = {",": "，", ".": "。", "!": "！", "?": "？", ";": "；", ":": "："}
+_ELLIPSIS_RE = re.compile(rf"(?<=[{_CJK}])(?:\.{{3,}}|。{{3,}})")
+_REPEATED_PUNCT_RE = re.compile(r"([，、])\1+")
+
+
 class ValidationError(ValueError):
     """Raised when user input is invalid."""
 
@@ -50,7 +101,31 @@ def _normalize_numeric_param(raw: object, name: str) -> str:
     return str(number)
 
 
-def validate_synthesis_payload(payload: object) -> Dict[str, str]:
+def _normalize_options_param(raw: object) -> Dict[str, bool]:
+    options = dict(NORMALIZATION_OPTIONS)
+    if raw is None:
+        return options
+    if not isinstance(raw, dict):
+        raise ValidationError("normalize 必须是 JSON 对象。")
+
+    for name, value in raw.items():
+        if name not in NORMALIZATION_OPTIONS:
+            raise ValidationError(f"normalize 不支持选项：{name}。")
+        if not isinstance(value, bool):
+            raise ValidationError(f"normalize.{name} 必须是 true 或 false。")
+        options[name] = value
+    return options
+
+
+def _normalize_start_chunk(raw: object) -> int:
+    if raw is None or raw == "":
+        return 0
+    if isinstance(raw, bool) or not re.fullmatch(r"\d+", str(raw).strip()):
+        raise ValidationError("start_chunk 必须是非负整数。")
+    return int(str(raw).strip())
+
+
+def validate_synthesis_payload(payload: object) -> Dict[str, object]:
     if not isinstance(payload, dict):
         raise ValidationError("请求体必须是 JSON 对象。")
 
@@ -62,6 +137,8 @@ def validate_synthesis_payload(payload: object) -> Dict[str, str]:
     style = str(payload.get("style") or DEFAULT_STYLE).strip() or DEFAULT_STYLE
     rate = _normalize_numeric_param(payload.get("rate"), "rate")
     pitch = _normalize_numeric_param(payload.get("pitch"), "pitch")
+    normalize = _normalize_options_param(payload.get("normalize"))
+    start_chunk = _normalize_start_chunk(payload.get("start_chunk"))
 
     return {
         "text": text,
@@ -69,9 +146,203 @@ def validate_synthesis_payload(payload: object) -> Dict[str, str]:
         "style": style,
         "rate": rate,
         "pitch": pitch,
+        "normalize": normalize,
+        "start_chunk": start_chunk,
     }
 
 
+def _strip_markup(text: str) -> str:
+    text = _HTML_BREAK_RE.sub("\n", text)
+    text = html.unescape(_HTML_TAG_RE.sub("", text)).replace("\xa0", " ")
+    text = _MD_FENCE_RE.sub("", text)
+    text = _MD_RULE_RE.sub("", text)
+    text = _MD_HEADING_RE.sub("", text)
+    text = _MD_QUOTE_RE.sub("", text)
+    text = _MD_LINK_RE.sub(r"\1", text)
+    text = _MD_CODE_RE.sub(r"\1", text)
+    text = _MD_STAR_EMPHASIS_RE.sub(r"\2", text)
+    return _MD_UNDERSCORE_EMPHASIS_RE.sub(r"\2", text)
+
+
+def _join_wrapped(left: str, right: str) -> str:
+    if re.match(rf"[{_CJK}]", left[-1]) or re.match(rf"[{_CJK}]", right[0]):
+        return left + right
+    return f"{left} {right}"
+
+
+def _strip_list_marker(line: str) -> str:
+    """Drop bullet markers; keep ordered-list numbers, which are spoken, as "1、"."""
+    line = _BULLET_RE.sub("", line, count=1)
+    return _ORDERED_MARKER_RE.sub(r"\1、", line, count=1)
+
+
+def _is_hard_wrapped(line: str, following: str, width: int) -> bool:
+    return (
+        len(line) >= MIN_WRAP_WIDTH
+        and len(line) >= SOFT_WRAP_RATIO * width
+        and not _SENTENCE_END_RE.search(line)
+        and bool(following)
+    )
+
+
+def _collapse_whitespace(text: str, strip_list_markers: bool = False) -> str:
+    lines: List[str] = []
+    list_items: List[bool] = []
+    for raw in text.split("\n"):
+        is_item = bool(_LIST_ITEM_RE.match(raw))
+        if is_item and strip_list_markers:
+            raw = _strip_list_marker(raw)
+        lines.append(_CJK_SPACE_RE.sub("", _INLINE_SPACE_RE.sub(" ", raw).strip()))
+        list_items.append(is_item)
+
+    # The wrap column is taken from prose lines only; list items and short lines never wrap.
+    width = max((len(line) for line, item in zip(lines, list_items) if not item), default=0)
+
+    paragraphs: List[str] = []
+    current = ""
+    soft_wrap = False
+    for index, line in enumerate(lines):
+        if not line:
+            if current:
+                paragraphs.append(current)
+            current = ""
+            soft_wrap = False
+            continue
+
+        if not current:
+            current = line
+        elif soft_wrap:
+            current = _join_wrapped(current, line)
+        else:
+            current = f"{current}\n{line}"
+
+        following = lines[index + 1] if index + 1 < len(lines) else ""
+        following_item = index + 1 < len(lines) and list_items[index + 1]
+        soft_wrap = not list_items[index] and not following_item and _is_hard_wrapped(line, following, width)
+
+    if current:
+        paragraphs.append(current)
+    return "\n".join(paragraphs)
+
+
+def normalize_text(
+    text: str,
+    strip_markup: bool = True,
+    collapse_whitespace: bool = True,
+    normalize_punctuation: bool = True,
+) -> str:
+    """Drop characters that are billed upstream but never change the spoken audio."""
+    normalized = text.replace("\r\n", "\n")
+    if strip_markup:
+        normalized = _strip_markup(normalized)
+    if normalize_punctuation:
+        normalized = _FULLWIDTH_ALNUM_RE.sub(lambda match: chr(ord(match.group()) - 0xFEE0), normalized)
+    if collapse_whitespace:
+        normalized = _collapse_whitespace(normalized, strip_list_markers=strip_markup)
+    elif strip_markup:
+        normalized = "\n".join(
+            _strip_list_marker(line) if _LIST_ITEM_RE.match(line) else line for line in normalized.split("\n")
+        )
+    if normalize_punctuation:
+        normalized = _ELLIPSIS_RE.sub("……", normalized)
+        normalized = _HALFWIDTH_PUNCT_RE.sub(lambda match: _HALFWIDTH_TO_FULLWIDTH[match.group(1)], normalized)
+        normalized = _REPEATED_PUNCT_RE.sub(r"\1", normalized)
+    return normalized
+
+
+def _dedupe_segments(text: str) -> List[str]:
+    paragraphs = text.split("\n")
+    counts = Counter(item.strip() for item in paragraphs)
+
+    segments: List[str] = []
+    pending: List[str] = []
+    for paragraph in paragraphs:
+        key = paragraph.strip()
+        if counts[key] > 1 and len(key) >= DEDUPE_MIN_CHARS:
+            if pending:
+                segments.append("\n".join(pending))
+                pending = []
+            segments.append(key)
+        else:
+            pending.append(paragraph)
+
+    if pending:
+        segments.append("\n".join(pending))
+    return segments
+
+
+def _build_plan(segments: List[str], max_chars: int) -> Tuple[List[str], List[int]]:
+    chunks: List[str] = []
+    sequence: List[int] = []
+    index_by_chunk: Dict[str, int] = {}
+    for segment in segments:
+        for chunk in split_text_into_chunks(segment, max_chars=max_chars):
+            if chunk not in index_by_chunk:
+                index_by_chunk[chunk] = len(chunks)
+                chunks.append(chunk)
+            sequence.append(index_by_chunk[chunk])
+    return chunks, sequence
+
+
+def plan_synthesis(
+    text: str,
+    max_chars: int = MAX_CHARS_PER_CHUNK,
+    options: Optional[Dict[str, bool]] = None,
+) -> Dict[str, object]:
+    """Normalize and chunk text, synthesizing each distinct chunk only once.
+
+    ``text`` is the source the plan was built from, ``chunks`` the distinct chunk
+    texts, ``sequence`` the chunk indexes in playback order and ``stats`` the
+    characters and upstream calls saved compared to chunking the raw text.
+    """
+    settings = {**NORMALIZATION_OPTIONS, **(options or {})}
+    source = text.replace("\r\n", "\n")
+    normalized = normalize_text(
+        source,
+        strip_markup=settings["strip_markup"],
+        collapse_whitespace=settings["collapse_whitespace"],
+        normalize_punctuation=settings["normalize_punctuation"],
+    )
+
+    chunks, sequence = _build_plan([normalized], max_chars)
+    if settings["dedupe_paragraphs"]:
+        # Forcing boundaries around repeats can split otherwise full chunks; keep whichever plan is cheaper.
+        deduped = _build_plan(_dedupe_segments(normalized), max_chars)
+        if (len(deduped[0]), sum(map(len, deduped[0]))) < (len(chunks), sum(map(len, chunks))):
+            chunks, sequence = deduped
+
+    chars_sent = sum(len(chunk) for chunk in chunks)
+    chunks_before = len(split_text_into_chunks(source, max_chars=max_chars))
+    return {
+        "text": source,
+        "chunks": chunks,
+        "sequence": sequence,
+        "stats": {
+            "chars_in": len(source),
+            "chars_sent": chars_sent,
+            "chars_saved": len(source) - chars_sent,
+            "chunks_before": chunks_before,
+            "chunks_sent": len(chunks),
+            "chunks_avoided": chunks_before - len(chunks),
+        },
+    }
+
+
+def synthesis_cache_key(payload: Dict[str, object]) -> str:
+    """Stable key for a validated payload; the web UI hashes the same array.
+
+    Normalization flags only join the key when they differ from the defaults,
+    so requests that leave them alone keep the five-field key.
+    """
+    fields: List[object] = [payload["text"], payload["voice_name"], payload["style"], payload["rate"], payload["pitch"]]
+    normalize = payload.get("normalize") or {}
+    overrides = {name: value for name, value in normalize.items() if value != NORMALIZATION_OPTIONS.get(name)}
+    if overrides:
+        fields.append(overrides)
+    serialized = json.dumps(fields, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
 def split_text_into_chunks(text: str, max_chars: int = MAX_CHARS_PER_CHUNK) -> List[str]:
     normalized = text.replace("\r\n", "\n")
     if not normalized:
@@ -111,24 +382,39 @@ def synthesize_text(
     rate: str = DEFAULT_RATE,
     pitch: str = DEFAULT_PITCH,
     max_chars: int = MAX_CHARS_PER_CHUNK,
+    max_chunks: Optional[int] = None,
+    plan: Optional[Dict[str, object]] = None,
+    start_chunk: int = 0,
 ) -> bytes:
-    chunks = split_text_into_chunks(text, max_chars=max_chars)
-    if not chunks:
+    """Synthesize ``text``, reusing ``plan`` when the caller already built it with ``plan_synthesis(text)``.
+
+    ``start_chunk`` skips chunks the client already holds (e.g. a speculative
+    first chunk); the result may then be empty.
+    """
+    if plan is None:
+        plan = plan_synthesis(text, max_chars=max_chars)
+    elif plan["text"] != text.replace("\r\n", "\n"):
+        raise ValueError("plan was built from different text")
+    chunks: List[str] = plan["chunks"]
+    sequence: List[int] = plan["sequence"]
+    if not sequence:
         raise ValidationError("请输入要合成的文字。")
-
-    audio_parts: List[bytes] = []
-    for chunk in chunks:
-        audio_parts.append(
-            get_voice(
-                text=chunk,
+    sequence = sequence[start_chunk:]
+    if max_chunks is not None:
+        sequence = sequence[:max_chunks]
+
+    audio_by_index: Dict[int, bytes] = {}
+    for index in sequence:
+        if index not in audio_by_index:
+            audio_by_index[index] = get_voice(
+                text=chunks[index],
                 voice_name=voice_name,
                 style=style,
                 rate=rate,
                 pitch=pitch,
             )
-        )
 
-    return b"".join(audio_parts)
+    return b"".join(audio_by_index[index] for index in sequence)
 
 
 def _build_voice_item(voice: Dict[str, object]) -> Dict[str, str]:
@@ -1,11 +1,22 @@
 from __future__ import annotations
 
+import hashlib
+import json
 from datetime import datetime
+from typing import Dict, Iterator, List, Optional
 
 import requests as http_client
-from flask import Flask, Response, jsonify, render_template, request
+from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+from requests.adapters import HTTPAdapter
 
-from tts_service import ValidationError, get_available_voices, synthesize_text, validate_synthesis_payload
+from tts_service import (
+    ValidationError,
+    get_available_voices,
+    plan_synthesis,
+    synthesis_cache_key,
+    synthesize_text,
+    validate_synthesis_payload,
+)
 
 app = Flask(__name__)
 app.config["MAX_CONTENT_LENGTH"] = 25 * 1024 * 1024
@@ -20,12 +31,114 @@ ANALYZE_SYSTEM_PROMPT = (
     "用清晰的 Markdown 格式回复。"
 )
 
+# Shared keep-alive connection pool for the transcription / analysis upstream.
+http_session = http_client.Session()
+http_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+
 
 def error_response(error_code: str, message: str, status_code: int) -> Response:
     payload = {"error_code": error_code, "message": message}
     return jsonify(payload), status_code
 
 
+def _audio_response(
+    audio_data: bytes, etag: str, filename: str, stats: Optional[Dict[str, int]] = None
+) -> Response:
+    headers = {
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "Cache-Control": "private, no-cache",
+    }
+    if stats is not None:
+        headers["X-TTS-Chars-Saved"] = str(stats["chars_saved"])
+        headers["X-TTS-Chunks-Avoided"] = str(stats["chunks_avoided"])
+    response = Response(audio_data, status=200, mimetype="audio/mpeg", headers=headers)
+    response.set_etag(etag)
+    return response
+
+
+def _post_transcription(audio_file, response_format: str) -> http_client.Response:
+    files = {"file": (audio_file.filename, audio_file.stream, audio_file.mimetype)}
+    data = {
+        "model": "whisper-1",
+        "response_format": response_format,
+        "language": "zh",
+    }
+    headers = {"Authorization": f"Bearer {TRANSCRIBE_API_KEY}"}
+    return http_session.post(
+        TRANSCRIBE_API_URL,
+        headers=headers,
+        files=files,
+        data=data,
+        timeout=120,
+    )
+
+
+def _post_analysis(text: str, stream: bool = False) -> http_client.Response:
+    body = {
+        "model": ANALYZE_MODEL,
+        "messages": [
+            {"role": "system", "content": ANALYZE_SYSTEM_PROMPT},
+            {"role": "user", "content": text},
+        ],
+    }
+    if stream:
+        body["stream"] = True
+    return http_session.post(
+        ANALYZE_API_URL,
+        headers={
+            "Authorization": f"Bearer {TRANSCRIBE_API_KEY}",
+            "Content-Type": "application/json",
+        },
+        json=body,
+        timeout=120,
+        stream=stream,
+    )
+
+
+def _parse_transcript_segments(resp: http_client.Response) -> List[str]:
+    try:
+        result = resp.json()
+    except ValueError:
+        text = resp.text.strip()
+        return [text] if text else []
+
+    if not isinstance(result, dict):
+        return []
+
+    segments = [
+        str(item.get("text", "")).strip()
+        for item in result.get("segments") or []
+        if isinstance(item, dict)
+    ]
+    segments = [item for item in segments if item]
+    if segments:
+        return segments
+
+    text = str(result.get("text", "")).strip()
+    return [text] if text else []
+
+
+def _iter_analysis_deltas(resp: http_client.Response) -> Iterator[str]:
+    resp.encoding = "utf-8"
+    for line in resp.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            break
+        chunk = json.loads(data)
+        choices = chunk.get("choices") or []
+        if not choices:
+            continue
+        delta = (choices[0].get("delta") or {}).get("content")
+        if delta:
+            yield delta
+
+
+def _ndjson_line(event: Dict[str, object]) -> str:
+    return json.dumps(event, ensure_ascii=False) + "\n"
+
+
 @app.get("/")
 def index() -> str:
     return render_template("index.html")
@@ -34,10 +147,16 @@ def index() -> str:
 @app.get("/api/voices")
 def voices() -> Response:
     try:
-        return jsonify({"voices": get_available_voices()})
+        voice_list = get_available_voices()
     except Exception as exc:  # pragma: no cover - external dependency failures
         return error_response("voice_list_failed", f"获取音色失败：{exc}", 500)
 
+    serialized = json.dumps(voice_list, ensure_ascii=False, sort_keys=True)
+    response = jsonify({"voices": voice_list})
+    response.set_etag(hashlib.sha256(serialized.encode("utf-8")).hexdigest())
+    response.headers["Cache-Control"] = "no-cache"
+    return response.make_conditional(request)
+
 
 @app.post("/api/synthesize")
 def synthesize() -> Response:
@@ -46,13 +165,22 @@ def synthesize() -> Response:
     except ValidationError as exc:
         return error_response("invalid_request", str(exc), 400)
 
+    # With start_chunk the client already holds the leading chunks (the speculative
+    # preview) and appends this remainder to them, so the stats still describe the
+    # whole document it ends up with.
+    etag = synthesis_cache_key(payload)
+    if payload["start_chunk"]:
+        etag = f"{etag}-from{payload['start_chunk']}"
     try:
+        plan = plan_synthesis(payload["text"], options=payload["normalize"])
         audio_data = synthesize_text(
             text=payload["text"],
             voice_name=payload["voice_name"],
             style=payload["style"],
             rate=payload["rate"],
             pitch=payload["pitch"],
+            plan=plan,
+            start_chunk=payload["start_chunk"],
         )
     except ValidationError as exc:
         return error_response("invalid_request", str(exc), 400)
@@ -60,8 +188,34 @@ def synthesize() -> Response:
         return error_response("synthesis_failed", f"合成失败：{exc}", 500)
 
     filename = datetime.now().strftime("tts_%Y%m%d_%H%M%S.mp3")
-    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-    return Response(audio_data, status=200, mimetype="audio/mpeg", headers=headers)
+    return _audio_response(audio_data, etag, filename, plan["stats"])
+
+
+@app.post("/api/synthesize/preview")
+def synthesize_preview() -> Response:
+    try:
+        payload = validate_synthesis_payload(request.get_json(silent=True))
+    except ValidationError as exc:
+        return error_response("invalid_request", str(exc), 400)
+
+    etag = f"{synthesis_cache_key(payload)}-first"
+    try:
+        plan = plan_synthesis(payload["text"], options=payload["normalize"])
+        audio_data = synthesize_text(
+            text=payload["text"],
+            voice_name=payload["voice_name"],
+            style=payload["style"],
+            rate=payload["rate"],
+            pitch=payload["pitch"],
+            max_chunks=1,
+            plan=plan,
+        )
+    except ValidationError as exc:
+        return error_response("invalid_request", str(exc), 400)
+    except Exception as exc:
+        return error_response("synthesis_failed", f"合成失败：{exc}", 500)
+
+    return _audio_response(audio_data, etag, "tts_preview.mp3")
 
 
 @app.post("/api/transcribe")
@@ -74,21 +228,7 @@ def transcribe():
         return error_response("no_file", "请选择一个有效的音频文件。", 400)
 
     try:
-        files = {"file": (audio_file.filename, audio_file.stream, audio_file.mimetype)}
-        data = {
-            "model": "whisper-1",
-            "response_format": "text",
-            "language": "zh",
-        }
-        headers = {"Authorization": f"Bearer {TRANSCRIBE_API_KEY}"}
-
-        resp = http_client.post(
-            TRANSCRIBE_API_URL,
-            headers=headers,
-            files=files,
-            data=data,
-            timeout=120,
-        )
+        resp = _post_transcription(audio_file, "text")
 
         if resp.status_code == 200:
             try:
@@ -113,21 +253,7 @@ def analyze():
         return error_response("no_text", "请提供要分析的文本。", 400)
 
     try:
-        resp = http_client.post(
-            ANALYZE_API_URL,
-            headers={
-                "Authorization": f"Bearer {TRANSCRIBE_API_KEY}",
-                "Content-Type": "application/json",
-            },
-            json={
-                "model": ANALYZE_MODEL,
-                "messages": [
-                    {"role": "system", "content": ANALYZE_SYSTEM_PROMPT},
-                    {"role": "user", "content": payload["text"]},
-                ],
-            },
-            timeout=120,
-        )
+        resp = _post_analysis(payload["text"])
         resp.raise_for_status()
         data = resp.json()
         content = data["choices"][0]["message"]["content"]
@@ -142,6 +268,66 @@ def analyze():
         return error_response("analyze_failed", f"分析失败：{exc}", 500)
 
 
+@app.post("/api/pipeline")
+def pipeline():
+    """Transcribe the upload, then analyze the transcript, in one NDJSON response.
+
+    Transcription is not incremental. The audio goes upstream in a single
+    call because nothing in the dependencies can split MP3/M4A/OGG/WebM audio.
+    The ``transcript`` events are only the upstream segments of that one
+    result. They are sent together after it returns, and ``index`` gives their
+    order. Analysis starts only after that, so transcription and analysis never
+    overlap. Only the analysis is streamed, one ``analysis`` event per delta.
+    The stream ends with ``done`` or with an ``error`` event.
+    """
+    if "file" not in request.files:
+        return error_response("no_file", "没有收到文件", 400)
+
+    audio_file = request.files["file"]
+    if not audio_file.filename:
+        return error_response("no_file", "请选择一个有效的音频文件。", 400)
+
+    def generate() -> Iterator[str]:
+        try:
+            resp = _post_transcription(audio_file, "verbose_json")
+            if resp.status_code != 200:
+                message = resp.text[:200] or f"HTTP {resp.status_code}"
+                yield _ndjson_line({"type": "error", "error_code": "transcribe_failed", "message": message})
+                return
+
+            segments = _parse_transcript_segments(resp)
+            if not segments:
+                yield _ndjson_line(
+                    {"type": "error", "error_code": "empty_transcript", "message": "转录结果为空，请检查音频是否包含语音。"}
+                )
+                return
+
+            for index, segment in enumerate(segments):
+                yield _ndjson_line({"type": "transcript", "index": index, "text": segment})
+        except http_client.exceptions.Timeout:
+            yield _ndjson_line({"type": "error", "error_code": "timeout", "message": "转录超时，请尝试较短的音频文件。"})
+            return
+        except Exception as exc:
+            yield _ndjson_line({"type": "error", "error_code": "transcribe_failed", "message": f"转录失败：{exc}"})
+            return
+
+        try:
+            with _post_analysis("\n".join(segments), stream=True) as resp:
+                resp.raise_for_status()
+                for delta in _iter_analysis_deltas(resp):
+                    yield _ndjson_line({"type": "analysis", "delta": delta})
+        except http_client.exceptions.Timeout:
+            yield _ndjson_line({"type": "error", "error_code": "timeout", "message": "分析超时，请稍后重试。"})
+            return
+        except Exception as exc:
+            yield _ndjson_line({"type": "error", "error_code": "analyze_failed", "message": f"分析失败：{exc}"})
+            return
+
+        yield _ndjson_line({"type": "done"})
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.errorhandler(413)
 def file_too_large(e):
     return error_response("file_too_large", "文件过大，最大支持 25MB。", 413)